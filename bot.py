@@ -1,13 +1,26 @@
 import os
 import logging
 import asyncio
+import itertools
+import math
 import re
+import signal
 import aiohttp
-import json
+import random
+import time
+import uuid
+import orjson
 from datetime import datetime
+from urllib.parse import urljoin
 
 import discord
 
+# Use uvloop's faster libuv-based event loop when available
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,112 +28,389 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Set LOG_LEVEL=DEBUG for per-message logs (this module only, not discord.py's gateway logs)
+LOG_LEVEL = (os.getenv('LOG_LEVEL') or 'INFO').upper()
+try:
+    logger.setLevel(LOG_LEVEL)
+except ValueError:
+    logger.setLevel(logging.INFO)
+    logger.warning(f"⚠️ Invalid LOG_LEVEL {LOG_LEVEL!r} - using INFO")
+
 # Configuration
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Your Vercel API endpoint (backup)
 WEBSOCKET_SERVER_URL = os.getenv('WEBSOCKET_SERVER_URL', 'http://localhost:3001')  # WebSocket server
 GUILD_ID = os.getenv('GUILD_ID')  # Optional: Specific Discord Server ID to monitor
+PORT = int(os.getenv('PORT', 8080))  # Health check server port
+WEBHOOK_BATCH_URL = os.getenv('WEBHOOK_BATCH_URL') or (
+    urljoin(WEBHOOK_URL, '/api/discord/messages') if WEBHOOK_URL else None
+)  # Vercel batch endpoint (accepts a JSON array of messages)
+
+# WebSocket batching - each POST carries up to WEBSOCKET_BATCH_SIZE messages collected over at most WEBSOCKET_BATCH_WINDOW seconds
+WEBSOCKET_BATCH_SIZE = 50
+WEBSOCKET_BATCH_WINDOW = 0.25
+WEBSOCKET_QUEUE_SIZE = 10_000
+WEBSOCKET_MAX_IN_FLIGHT = 64  # concurrent batch POSTs
+WEBSOCKET_MAX_ATTEMPTS = 3  # quick retries (50 ms, 200 ms) for transient failures
+
+# Vercel batching - flush every VERCEL_FLUSH_INTERVAL seconds or once VERCEL_BATCH_SIZE messages are queued
+VERCEL_BATCH_SIZE = 10
+VERCEL_FLUSH_INTERVAL = 0.2
+VERCEL_MAX_IN_FLIGHT = 32  # concurrent batch POSTs
+VERCEL_PENDING_LIMIT = 5_000  # messages buffered while all POSTs are busy; newer messages are dropped beyond this
+
+# Vercel retries - transient failures are retried with exponential backoff, then parked for a later retry
+VERCEL_MAX_ATTEMPTS = 4
+VERCEL_RETRY_QUEUE_SIZE = 100  # batches
+VERCEL_RETRY_INTERVAL = 5.0  # minimum wait before a parked batch is resent
+VERCEL_MAX_RETRY_DELAY = 30.0  # longest in-line backoff; a longer Retry-After parks the batch instead
+VERCEL_MAX_PARK_DELAY = 300.0  # longest a parked batch waits, whatever Retry-After asks for
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+
+# Total timeout applied to every outbound request via the shared session
+_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# How long a WebSocket server health probe result is reused (seconds)
+HEALTH_CACHE_TTL = 5.0
+
+# Longest the shutdown flush may take (seconds) - Render allows 30s between SIGTERM and SIGKILL by default
+SHUTDOWN_FLUSH_TIMEOUT = 20.0
 
 # Channel configuration - ONLY these channels will be monitored
-CHANNEL_NAMES = {
-    1251179699674288208: "SHOCKED",
-    1251848915305631834: "VANQUISH", 
-    1250885750158000203: "DIGI",
-    1323011103894016133: "PASTEL",
-    1358931443786584144: "CRYPTIC",
-    1256632909008339035: "YOGURTVERSE",
-    1319692012261347360: "HEAVEN OR HELL",
-    1316031095497818143: "MINTED",
-    1392587523838185592: "SERENITY",
-    1302921864540323861: "TECHNICAL ALPHA",
-    1307140339991183380: "PF TRENCHES",
-    1304074398185029632: "POTION",
-    1250885751768481849: "PROSPERITY DAO",
-    1316784867962519603: "SECRET SOCIETY",
+# Discord channel ID -> (display name, WebSocket server channel ID)
+CHANNEL_INFO = {
+    1251179699674288208: ("SHOCKED", "shocked"),
+    1251848915305631834: ("VANQUISH", "vanquish"),
+    1250885750158000203: ("DIGI", "digi"),
+    1323011103894016133: ("PASTEL", "pastel"),
+    1358931443786584144: ("CRYPTIC", "cryptic"),
+    1256632909008339035: ("YOGURTVERSE", "yogurtverse"),
+    1319692012261347360: ("HEAVEN OR HELL", "heaven_or_hell"),
+    1316031095497818143: ("MINTED", "minted"),
+    1392587523838185592: ("SERENITY", "serenity"),
+    1302921864540323861: ("TECHNICAL ALPHA", "technical_alpha"),
+    1307140339991183380: ("PF TRENCHES", "pf_trenches"),
+    1304074398185029632: ("POTION", "potion"),
+    1250885751768481849: ("PROSPERITY DAO", "prosperity_dao"),
+    1316784867962519603: ("SECRET SOCIETY", "secret_society"),
 }
 
-# Map Discord channel IDs to WebSocket server channel IDs
-CHANNEL_ID_MAPPING = {
-    1251179699674288208: "shocked",
-    1251848915305631834: "vanquish", 
-    1250885750158000203: "digi",
-    1323011103894016133: "pastel",
-    1358931443786584144: "cryptic",
-    1256632909008339035: "yogurtverse",
-    1319692012261347360: "heaven_or_hell",
-    1316031095497818143: "minted",
-    1392587523838185592: "serenity",
-    1302921864540323861: "technical_alpha",
-    1307140339991183380: "pf_trenches",
-    1304074398185029632: "potion",
-    1250885751768481849: "prosperity_dao",
-    1316784867962519603: "secret_society",
-}
+# Precomputed lookups for the per-message filters in on_message
+_MONITORED_CHANNEL_IDS: frozenset[int] = frozenset(CHANNEL_INFO)
+_GUILD_ID_INT: int | None = int(GUILD_ID) if GUILD_ID else None
+
+# Matches **@mention** so the bold markers can be stripped
+_MENTION_RE = re.compile(r'\*\*(@[^*]+)\*\*')
+
+# Shared stand-in for the attachments/embeds lists of plain-text messages (immutable, serializes as [])
+_EMPTY = ()
+
+# Attachment extensions treated as images when Discord gives no content type
+_IMAGE_EXTS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp'})
+
+# Discord client setup - only channel messages are read, so skip member chunking and the member/message caches
+discord_client = discord.Client(
+    chunk_guilds_at_startup=False,
+    member_cache_flags=discord.MemberCacheFlags.none(),
+    max_messages=None
+)
+
+# Shared HTTP session for all outbound requests (reuses keep-alive connections)
+http_session: aiohttp.ClientSession | None = None
+
+# Messages waiting to be sent to the WebSocket server (bounded for backpressure)
+websocket_queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=WEBSOCKET_QUEUE_SIZE)
+websocket_flusher_task: asyncio.Task | None = None
+# Batch the flusher is still collecting - kept here so flush_remaining can send it on shutdown
+websocket_batch_in_progress: list[dict] = []
+websocket_send_semaphore = asyncio.Semaphore(WEBSOCKET_MAX_IN_FLIGHT)
 
-# Discord client setup
-discord_client = discord.Client()
+# Messages waiting to be flushed to Vercel
+pending_vercel: list[dict] = []
+vercel_flush_event = asyncio.Event()
+vercel_flusher_task: asyncio.Task | None = None
+vercel_send_semaphore = asyncio.Semaphore(VERCEL_MAX_IN_FLIGHT)
 
-async def send_to_websocket_server(message_data):
-    """Send message data to WebSocket server (primary)"""
+# Fire-and-forget tasks (strong refs so they aren't garbage collected mid-flight)
+background_tasks: set[asyncio.Task] = set()
+
+# Batches that exhausted their retries as (resend_at loop time, seq, messages), soonest first,
+# resent by retry_failed_vercel_batches (seq keeps ties in parking order and never compares messages)
+vercel_retry_queue: asyncio.PriorityQueue[tuple[float, int, list[dict]]] = asyncio.PriorityQueue(maxsize=VERCEL_RETRY_QUEUE_SIZE)
+_retry_seq = itertools.count()
+vercel_retry_task: asyncio.Task | None = None
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use"""
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, limit_per_host=32, keepalive_timeout=75, ttl_dns_cache=300),
+            timeout=_REQUEST_TIMEOUT
+        )
+    return http_session
+
+def spawn(coro):
+    """Run a coroutine in the background without awaiting it"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def send_to_websocket_server(messages):
+    """Send a batch of messages to WebSocket server (primary), retrying transient failures"""
     if not WEBSOCKET_SERVER_URL:
         logger.warning("WEBSOCKET_SERVER_URL not configured")
         return False
     
+    body = orjson.dumps({"messages": messages})
+    # Same key on every attempt so the server can drop a batch it already committed
+    headers = {"Content-Type": "application/json", "Idempotency-Key": uuid.uuid4().hex}
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{WEBSOCKET_SERVER_URL}/api/message",
-                json=message_data,
-                headers={"Content-Type": "application/json"},
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    logger.info(f"✅ Message sent to WebSocket server: {message_data['author']['name']}")
-                    return True
-                else:
+        for attempt in range(WEBSOCKET_MAX_ATTEMPTS):
+            try:
+                async with get_session().post(
+                    f"{WEBSOCKET_SERVER_URL}/api/messages/batch",
+                    data=body,
+                    headers=headers
+                ) as response:
+                    if response.status == 200:
+                        logger.debug("✅ %d message(s) sent to WebSocket server", len(messages))
+                        return True
+                    
                     error_text = await response.text()
-                    logger.error(f"❌ Failed to send to WebSocket server: {response.status} - {error_text}")
-                    return False
+                    if response.status < 500 and response.status != 429:
+                        logger.error("❌ Failed to send to WebSocket server: %s - %s", response.status, error_text)
+                        return False
+                    
+                    logger.warning("⚠️ WebSocket server returned %s (attempt %d/%d)", response.status, attempt + 1, WEBSOCKET_MAX_ATTEMPTS)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("⚠️ Error sending to WebSocket server (attempt %d/%d): %r", attempt + 1, WEBSOCKET_MAX_ATTEMPTS, e)
+            
+            if attempt + 1 < WEBSOCKET_MAX_ATTEMPTS:
+                await asyncio.sleep(0.05 * 4 ** attempt)
     except Exception as e:
-        logger.error(f"❌ Error sending to WebSocket server: {e}")
+        logger.error("❌ Error sending to WebSocket server: %s", e)
         return False
+    
+    logger.error("❌ Failed to send %d message(s) to WebSocket server after %d attempts", len(messages), WEBSOCKET_MAX_ATTEMPTS)
+    return False
 
-async def send_to_vercel(message_data):
-    """Send message data to Vercel API (backup)"""
+async def submit_to_websocket_server(messages):
+    """Send a batch to the WebSocket server, releasing the send slot taken by the flusher"""
+    try:
+        await send_to_websocket_server(messages)
+    finally:
+        websocket_send_semaphore.release()
+
+async def flush_to_websocket_server():
+    """Drain the WebSocket queue into batched POSTs"""
+    loop = asyncio.get_running_loop()
+    while True:
+        # Wait for a free send slot before taking messages off the queue, so a slow server
+        # backs up into the bounded queue (which then drops) instead of into unbounded tasks
+        await websocket_send_semaphore.acquire()
+        websocket_batch_in_progress.append(await websocket_queue.get())
+        deadline = loop.time() + WEBSOCKET_BATCH_WINDOW
+        while len(websocket_batch_in_progress) < WEBSOCKET_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                websocket_batch_in_progress.append(await asyncio.wait_for(websocket_queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        
+        batch = websocket_batch_in_progress[:]
+        websocket_batch_in_progress.clear()
+        # Don't wait on the POST - keep draining the queue while it's in flight
+        spawn(submit_to_websocket_server(batch))
+
+def parse_retry_after(value):
+    """Parse a Retry-After header given in seconds (HTTP-date values are ignored)"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    # float() also accepts "inf" and "nan", which no sleep can honour
+    return max(seconds, 0.0) if math.isfinite(seconds) else None
+
+def retry_delay(attempt, retry_after=None):
+    """Exponential backoff with jitter, honouring Retry-After up to VERCEL_MAX_RETRY_DELAY seconds"""
+    delay = 0.5 * 2 ** attempt
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return min(delay, VERCEL_MAX_RETRY_DELAY) + random.uniform(0, 0.25)
+
+async def send_to_vercel(messages):
+    """Send a batch of messages to Vercel API (backup), retrying transient failures
+    
+    Batches that still fail after VERCEL_MAX_ATTEMPTS, or that Vercel asks us to hold off
+    on for longer than VERCEL_MAX_RETRY_DELAY, are parked on the retry queue.
+    """
     if not WEBHOOK_URL:
         logger.warning("WEBHOOK_URL not configured")
         return False
     
+    body = orjson.dumps(messages)
+    retry_after = None
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{WEBHOOK_URL}",
-                json=message_data,
-                headers={"Content-Type": "application/json"},
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                if response.status == 200:
-                    logger.info(f"✅ Message sent to Vercel backup: {message_data['author']['name']}")
-                    return True
-                else:
+        for attempt in range(VERCEL_MAX_ATTEMPTS):
+            retry_after = None
+            try:
+                async with get_session().post(
+                    WEBHOOK_BATCH_URL,
+                    data=body,
+                    headers={"Content-Type": "application/json"}
+                ) as response:
+                    if 200 <= response.status < 300:
+                        logger.debug("✅ %d message(s) sent to Vercel backup", len(messages))
+                        return True
+                    
                     error_text = await response.text()
-                    logger.error(f"❌ Failed to send to Vercel: {response.status} - {error_text}")
-                    return False
+                    if response.status not in RETRYABLE_STATUSES:
+                        logger.error("❌ Failed to send to Vercel: %s - %s", response.status, error_text)
+                        return False
+                    
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    logger.warning("⚠️ Vercel returned %s (attempt %d/%d)", response.status, attempt + 1, VERCEL_MAX_ATTEMPTS)
+                    if retry_after is not None and retry_after > VERCEL_MAX_RETRY_DELAY:
+                        # Don't sleep on it while holding a send slot - park until Vercel is ready
+                        logger.warning("⚠️ Vercel asked to retry after %.0fs - parking %d message(s)", retry_after, len(messages))
+                        park_for_retry(messages, retry_after)
+                        return False
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("⚠️ Error sending to Vercel (attempt %d/%d): %r", attempt + 1, VERCEL_MAX_ATTEMPTS, e)
+            
+            if attempt + 1 < VERCEL_MAX_ATTEMPTS:
+                await asyncio.sleep(retry_delay(attempt, retry_after))
     except Exception as e:
-        logger.error(f"❌ Error sending to Vercel: {e}")
+        logger.error("❌ Error sending to Vercel: %s", e)
         return False
+    
+    logger.error("❌ Failed to send %d message(s) to Vercel after %d attempts", len(messages), VERCEL_MAX_ATTEMPTS)
+    park_for_retry(messages, retry_after)
+    return False
+
+def park_for_retry(messages, delay=None):
+    """Park a failed Vercel batch for a later retry, dropping it if the retry queue is full"""
+    delay = min(max(delay or 0.0, VERCEL_RETRY_INTERVAL), VERCEL_MAX_PARK_DELAY)
+    try:
+        vercel_retry_queue.put_nowait((asyncio.get_running_loop().time() + delay, next(_retry_seq), messages))
+    except asyncio.QueueFull:
+        logger.error("❌ Vercel retry queue full - dropping %d message(s)", len(messages))
+
+async def retry_failed_vercel_batches():
+    """Resend parked batches once their retry time has come"""
+    loop = asyncio.get_running_loop()
+    while True:
+        # Take the send slot before the batch, so a batch is never held off the queue across an
+        # await - if the worker is cancelled, everything parked is still there for flush_remaining.
+        # Goes through the same concurrency cap as fresh batches; failures re-park themselves.
+        await vercel_send_semaphore.acquire()
+        item = await vercel_retry_queue.get()
+        resend_at, _, messages = item
+        wait = resend_at - loop.time()
+        if wait > 0:
+            # Not due yet - put it back (nothing else ran since the get, so there's room) and look
+            # again shortly, in case a batch with an earlier resend time is parked meanwhile
+            vercel_retry_queue.put_nowait(item)
+            vercel_send_semaphore.release()
+            await asyncio.sleep(min(wait, VERCEL_RETRY_INTERVAL))
+            continue
+        spawn(submit_to_vercel(messages))
+
+async def submit_to_vercel(messages):
+    """Send a batch to Vercel, releasing the send slot taken by the caller"""
+    try:
+        await send_to_vercel(messages)
+    finally:
+        vercel_send_semaphore.release()
+
+def queue_for_vercel(message_data):
+    """Queue message data for the next Vercel batch, dropping it if the buffer is full"""
+    if len(pending_vercel) >= VERCEL_PENDING_LIMIT:
+        logger.error("❌ Vercel buffer full - dropping message from %s", message_data["author_name"])
+        return
+    pending_vercel.append(message_data)
+    if len(pending_vercel) >= VERCEL_BATCH_SIZE:
+        vercel_flush_event.set()
+
+async def flush_to_vercel():
+    """Flush queued messages to Vercel in batches"""
+    while True:
+        try:
+            await asyncio.wait_for(vercel_flush_event.wait(), timeout=VERCEL_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        vercel_flush_event.clear()
+        
+        # Don't wait on the POSTs - a slow or retrying Vercel shouldn't hold up the next flush.
+        # Each batch waits for a free send slot first, so a backlog stays in the capped buffer.
+        while pending_vercel:
+            await vercel_send_semaphore.acquire()
+            batch = pending_vercel[:VERCEL_BATCH_SIZE]
+            del pending_vercel[:VERCEL_BATCH_SIZE]
+            spawn(submit_to_vercel(batch))
+
+async def flush_remaining():
+    """Send everything still buffered to both targets and wait for in-flight sends (used on shutdown)
+    
+    Call only after the flusher and retry tasks have been stopped.
+    """
+    websocket_batch = websocket_batch_in_progress[:]
+    websocket_batch_in_progress.clear()
+    while not websocket_queue.empty():
+        websocket_batch.append(websocket_queue.get_nowait())
+    vercel_batch = pending_vercel[:]
+    pending_vercel.clear()
+    
+    sends = [
+        send_to_websocket_server(websocket_batch[i:i + WEBSOCKET_BATCH_SIZE])
+        for i in range(0, len(websocket_batch), WEBSOCKET_BATCH_SIZE)
+    ]
+    if WEBHOOK_URL:
+        sends += [
+            send_to_vercel(vercel_batch[i:i + VERCEL_BATCH_SIZE])
+            for i in range(0, len(vercel_batch), VERCEL_BATCH_SIZE)
+        ]
+        # Batches parked for a later retry get one last attempt
+        while not vercel_retry_queue.empty():
+            sends.append(send_to_vercel(vercel_retry_queue.get_nowait()[2]))
+    
+    # POSTs already in flight finish alongside the final sends
+    in_flight = asyncio.gather(*background_tasks, return_exceptions=True)
+    results = await asyncio.gather(*sends, return_exceptions=True)
+    await in_flight
+    failed = sum(1 for result in results if result is not True)
+    if failed:
+        logger.error(f"❌ {failed}/{len(results)} batch(es) failed to send on shutdown")
+    
+    # Anything parked by now has no retry worker left to send it
+    lost = 0
+    while not vercel_retry_queue.empty():
+        lost += len(vercel_retry_queue.get_nowait()[2])
+    if lost:
+        logger.error(f"❌ {lost} Vercel message(s) dropped on shutdown")
 
-def format_message_for_websocket(message: discord.Message) -> dict:
-    """Format Discord message for WebSocket server"""
+def extract_common_fields(message: discord.Message) -> tuple:
+    """Extract the fields shared by the WebSocket and Vercel formats
+    
+    Returns (cleaned_content, attachments, embeds, reply_info, author_info).
+    """
     
     # Process attachments
-    attachments = []
+    attachments = _EMPTY
     if message.attachments:
+        attachments = []
         for attachment in message.attachments:
+            content_type = attachment.content_type
+            # Extension lookup only runs when Discord gave no image content type
             is_image = (
-                attachment.content_type and attachment.content_type.startswith('image/') or
-                attachment.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'))
+                (content_type is not None and content_type.startswith('image/'))
+                or attachment.filename.rpartition('.')[2].lower() in _IMAGE_EXTS
             )
             attachments.append({
                 "filename": attachment.filename,
@@ -130,8 +420,9 @@ def format_message_for_websocket(message: discord.Message) -> dict:
             })
 
     # Process embeds (for bots like Rick, Utrax RepBot)
-    embeds = []
+    embeds = _EMPTY
     if message.embeds:
+        embeds = []
         for embed in message.embeds:
             embed_data = {
                 "title": embed.title,
@@ -144,9 +435,9 @@ def format_message_for_websocket(message: discord.Message) -> dict:
 
     # Clean content
     cleaned_content = message.content or ""
-    if cleaned_content:
+    if '**@' in cleaned_content:
         # Remove ** around @mentions
-        cleaned_content = re.sub(r'\*\*(@[^*]+)\*\*', r'\1', cleaned_content)
+        cleaned_content = _MENTION_RE.sub(r'\1', cleaned_content)
 
     # Handle replies
     reply_info = None
@@ -154,110 +445,96 @@ def format_message_for_websocket(message: discord.Message) -> dict:
         try:
             replied_message = message.reference.resolved
             if replied_message:
-                replied_content = replied_message.content[:50] + "..." if len(replied_message.content) > 50 else replied_message.content
+                replied_content = replied_message.content
+                if len(replied_content) > 50:
+                    replied_content = replied_content[:50] + "..."
                 reply_info = {
                     "author": replied_message.author.display_name,
                     "content": replied_content
                 }
-        except:
+        except AttributeError:
+            # DeletedReferencedMessage has no content/author
             reply_info = {"author": "Unknown", "content": "Message not found"}
 
+    # Author fields are read once and shared by both formats (Asset.url is already a str)
+    author = message.author
+    avatar = author.display_avatar
+    author_info = (author.display_name, avatar.url if avatar else None, author.bot)
+
+    return cleaned_content, attachments, embeds, reply_info, author_info
+
+def format_message_for_websocket(message: discord.Message, common: tuple | None = None) -> dict:
+    """Format Discord message for WebSocket server
+    
+    Pass the result of extract_common_fields as common to avoid recomputing it.
+    """
+    cleaned_content, attachments, embeds, reply_info, author_info = common or extract_common_fields(message)
+    author_name, author_avatar, author_bot = author_info
+
     # Format for WebSocket server
     return {
-        "channel_id": int(message.channel.id),  # WebSocket server expects the Discord channel ID
+        "channel_id": message.channel.id,  # WebSocket server expects the Discord channel ID
         "content": cleaned_content,
         "author": {
-            "name": message.author.display_name,
-            "avatar": str(message.author.display_avatar.url) if message.author.display_avatar else None,
-            "bot": message.author.bot
+            "name": author_name,
+            "avatar": author_avatar,
+            "bot": author_bot
         },
         "embeds": embeds,
         "attachments": attachments,
         "reply": reply_info
     }
 
-def format_message_for_vercel(message: discord.Message) -> dict:
-    """Format Discord message for Vercel API (legacy format)"""
+def format_message_for_vercel(message: discord.Message, common: tuple | None = None) -> dict:
+    """Format Discord message for Vercel API (legacy format)
     
-    # Process attachments
-    attachments = []
-    if message.attachments:
-        for attachment in message.attachments:
-            is_image = (
-                attachment.content_type and attachment.content_type.startswith('image/') or
-                attachment.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'))
-            )
-            attachments.append({
-                "filename": attachment.filename,
-                "url": attachment.url,
-                "is_image": is_image,
-                "size": attachment.size
-            })
-
-    # Process embeds
-    embeds = []
-    if message.embeds:
-        for embed in message.embeds:
-            embed_data = {
-                "title": embed.title,
-                "description": embed.description,
-                "url": embed.url,
-                "image": {"url": embed.image.url} if embed.image else None,
-                "thumbnail": {"url": embed.thumbnail.url} if embed.thumbnail else None
-            }
-            embeds.append(embed_data)
-
-    # Clean content
-    cleaned_content = message.content or ""
-    if cleaned_content:
-        # Remove ** around @mentions
-        cleaned_content = re.sub(r'\*\*(@[^*]+)\*\*', r'\1', cleaned_content)
-
-    # Handle replies
-    reply_info = None
-    if message.reference and message.reference.message_id:
-        try:
-            replied_message = message.reference.resolved
-            if replied_message:
-                replied_content = replied_message.content[:50] + "..." if len(replied_message.content) > 50 else replied_message.content
-                reply_info = {
-                    "author": replied_message.author.display_name,
-                    "content": replied_content
-                }
-        except:
-            reply_info = {"author": "Unknown", "content": "Message not found"}
+    Pass the result of extract_common_fields as common to avoid recomputing it.
+    """
+    cleaned_content, attachments, embeds, reply_info, author_info = common or extract_common_fields(message)
+    author_name, author_avatar, author_bot = author_info
 
     return {
-        "channel_id": str(message.channel.id),
-        "author_name": message.author.display_name,
-        "author_avatar": str(message.author.display_avatar.url) if message.author.display_avatar else None,
+        "channel_id": f"{message.channel.id}",  # Snowflakes stay strings for JS precision
+        "author_name": author_name,
+        "author_avatar": author_avatar,
         "content": cleaned_content,
         "timestamp": message.created_at.isoformat(),
-        "message_id": str(message.id),
+        "message_id": f"{message.id}",
         "attachments": attachments,
         "embeds": embeds,
         "reply": reply_info,
-        "is_bot": message.author.bot
+        "is_bot": author_bot
     }
 
+# Last WebSocket server health probe result
+_health_cache = {"ts": float("-inf"), "ok": False}
+
 async def check_websocket_server():
-    """Check if WebSocket server is running"""
+    """Check if WebSocket server is running (result cached for HEALTH_CACHE_TTL seconds)"""
+    now = time.monotonic()
+    if now - _health_cache["ts"] < HEALTH_CACHE_TTL:
+        return _health_cache["ok"]
+    
+    ok = False
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{WEBSOCKET_SERVER_URL}/api/health") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"✅ WebSocket server is healthy: {data}")
-                    return True
+        async with get_session().get(f"{WEBSOCKET_SERVER_URL}/api/health") as response:
+            if response.status == 200:
+                data = orjson.loads(await response.read())
+                logger.debug("✅ WebSocket server is healthy: %s", data)
+                ok = True
     except Exception as e:
-        logger.error(f"❌ WebSocket server health check failed: {e}")
-    return False
+        logger.error("❌ WebSocket server health check failed: %s", e)
+    
+    _health_cache["ts"] = now
+    _health_cache["ok"] = ok
+    return ok
 
 @discord_client.event
 async def on_ready():
+    global websocket_flusher_task, vercel_flusher_task, vercel_retry_task
     logger.info(f"🤖 Discord client `{discord_client.user}` logged in")
     logger.info(f"🔗 Connected to {len(discord_client.guilds)} guilds")
-    logger.info(f"🎯 Monitoring {len(CHANNEL_NAMES)} channels")
+    logger.info(f"🎯 Monitoring {len(CHANNEL_INFO)} channels")
     
     # Check WebSocket server connection
     if await check_websocket_server():
@@ -265,6 +542,14 @@ async def on_ready():
     else:
         logger.warning("⚠️ WebSocket server not available - messages will be lost!")
     
+    # Start the batch flushers and retry worker (on_ready fires again on reconnect)
+    if websocket_flusher_task is None:
+        websocket_flusher_task = asyncio.create_task(flush_to_websocket_server())
+    if vercel_flusher_task is None:
+        vercel_flusher_task = asyncio.create_task(flush_to_vercel())
+    if vercel_retry_task is None:
+        vercel_retry_task = asyncio.create_task(retry_failed_vercel_batches())
+    
     if GUILD_ID:
         logger.info(f"🏠 Targeting specific guild ID: {GUILD_ID}")
     
@@ -274,96 +559,118 @@ async def on_ready():
     
     # Find target guild if specified
     if GUILD_ID:
-        for guild in discord_client.guilds:
-            if str(guild.id) == str(GUILD_ID):
-                target_guild = guild
-                break
+        target_guild = discord_client.get_guild(_GUILD_ID_INT)
         
         if not target_guild:
             logger.error(f"❌ Could not find guild with ID: {GUILD_ID}")
             return
-        
-        guilds_to_check = [target_guild]
-    else:
-        guilds_to_check = discord_client.guilds
     
-    # Check for monitored channels
-    for guild in guilds_to_check:
-        logger.info(f"🔍 Checking guild: {guild.name}")
-        for channel_id in CHANNEL_NAMES.keys():
-            channel = guild.get_channel(channel_id)
-            if channel:
-                logger.info(f"✅ Found monitored channel: #{channel.name}")
-                found_channels += 1
+    # Resolve each monitored channel once from the client cache (O(channels), not O(guilds x channels))
+    for channel_id in CHANNEL_INFO:
+        channel = discord_client.get_channel(channel_id)
+        if channel and (target_guild is None or channel.guild.id == target_guild.id):
+            logger.debug("✅ Found monitored channel: #%s in %s", channel.name, channel.guild.name)
+            found_channels += 1
     
-    logger.info(f"📊 Found {found_channels}/{len(CHANNEL_NAMES)} monitored channels")
+    logger.info(f"📊 Found {found_channels}/{len(CHANNEL_INFO)} monitored channels")
 
 @discord_client.event
 async def on_message(message: discord.Message):
+    # Check if message is in a monitored channel (cheapest filter, rejects almost everything)
+    if message.channel.id not in _MONITORED_CHANNEL_IDS:
+        return
+    
     # Don't process own messages (prevent infinite loops)
     if message.author == discord_client.user:
         return
     
     # If GUILD_ID is specified, only process messages from that guild
-    if GUILD_ID and str(message.guild.id) != str(GUILD_ID):
-        return
-    
-    # Check if message is in a monitored channel
-    if message.channel.id not in CHANNEL_NAMES:
+    if _GUILD_ID_INT is not None and (message.guild is None or message.guild.id != _GUILD_ID_INT):
         return
     
     # Process ALL messages from monitored channels
     try:
-        # Format for WebSocket server (primary)
-        websocket_data = format_message_for_websocket(message)
-        websocket_success = await send_to_websocket_server(websocket_data)
+        # Attachments, embeds, content and reply are shared by both formats - extract them once
+        common = extract_common_fields(message)
+        
+        # Format for WebSocket server (primary), sent in batches by flush_to_websocket_server
+        try:
+            websocket_queue.put_nowait(format_message_for_websocket(message, common))
+        except asyncio.QueueFull:
+            logger.error("❌ WebSocket queue full - dropping message from %s", message.author.display_name)
         
-        # Format for Vercel (backup)
-        vercel_data = format_message_for_vercel(message)
-        vercel_success = await send_to_vercel(vercel_data)
+        # Format for Vercel (backup), sent in batches by flush_to_vercel - skipped entirely when not configured
+        if WEBHOOK_URL:
+            queue_for_vercel(format_message_for_vercel(message, common))
         
-        if websocket_success:
-            logger.info(f"📤 Processed via WebSocket: {message.author.display_name} in #{message.channel.name}")
-        elif vercel_success:
-            logger.info(f"📤 Processed via Vercel backup: {message.author.display_name} in #{message.channel.name}")
-        else:
-            logger.error(f"❌ Failed to process message from {message.author.display_name}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📤 Queued: %s in #%s: %.50s", message.author.display_name, CHANNEL_INFO[message.channel.id][0], message.content)
             
     except Exception as e:
-        logger.error(f"❌ Error processing message: {e}")
+        logger.error("❌ Error processing message: %s", e)
 
 # Health check endpoint
 from aiohttp import web
 
+# Current time as an ISO string, refreshed once a second by update_clock
+now_iso = datetime.now().isoformat(timespec='seconds')
+clock_task: asyncio.Task | None = None
+
+async def update_clock():
+    """Keep now_iso current so health checks don't format a timestamp per request"""
+    global now_iso
+    while True:
+        now_iso = datetime.now().isoformat(timespec='seconds')
+        await asyncio.sleep(1.0)
+
+# Parts of the health response that never change at runtime
+_HEALTH_STATIC = {
+    "status": "healthy",
+    "webhook_configured": bool(WEBHOOK_URL),
+    "websocket_server_configured": bool(WEBSOCKET_SERVER_URL),
+    "monitored_channels": len(CHANNEL_INFO),
+}
+
 async def health_check(request):
     websocket_healthy = await check_websocket_server()
+    client_ready = discord_client.is_ready()
     
-    return web.json_response({
-        "status": "healthy",
-        "client_ready": discord_client.is_ready(),
-        "guilds": len(discord_client.guilds) if discord_client.is_ready() else 0,
-        "webhook_configured": bool(WEBHOOK_URL),
-        "websocket_server_configured": bool(WEBSOCKET_SERVER_URL),
+    return web.Response(body=orjson.dumps({
+        **_HEALTH_STATIC,
+        "client_ready": client_ready,
+        "guilds": len(discord_client.guilds) if client_ready else 0,
         "websocket_server_healthy": websocket_healthy,
-        "monitored_channels": len(CHANNEL_NAMES),
-        "timestamp": datetime.now().isoformat()
-    })
+        "timestamp": now_iso
+    }), content_type="application/json")
 
 async def start_web_server():
     """Start a simple web server for health checks"""
+    global clock_task
     app = web.Application()
     app.router.add_get('/health', health_check)
     app.router.add_get('/', health_check)
     
-    runner = web.AppRunner(app)
+    # No access log - health probes are frequent and would flood stderr
+    runner = web.AppRunner(app, access_log=None, keepalive_timeout=75)
     await runner.setup()
     
-    port = int(os.getenv('PORT', 8080))
-    site = web.TCPSite(runner, '0.0.0.0', port)
+    site = web.TCPSite(runner, '0.0.0.0', PORT)
     await site.start()
-    logger.info(f"🌐 Health check server started on port {port}")
+    clock_task = asyncio.create_task(update_clock())
+    logger.info(f"🌐 Health check server started on port {PORT}")
 
 async def main():
+    # Render and container orchestrators stop the service with SIGTERM, which would otherwise kill
+    # the process without running the finally block below - cancel this task instead so the
+    # buffered messages are flushed (SIGINT the same way)
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, main_task.cancel)
+        except NotImplementedError:
+            pass  # Windows - Ctrl+C still arrives as KeyboardInterrupt
+    
     try:
         logger.info("🚀 Starting Discord WebSocket bridge...")
         
@@ -375,17 +682,23 @@ async def main():
             logger.error("❌ WEBSOCKET_SERVER_URL environment variable not set")
             return
         
+        if not WEBHOOK_URL:
+            logger.warning("⚠️ WEBHOOK_URL not set - Vercel backup disabled")
+        
         logger.warning("⚠️ WARNING: Using user token violates Discord ToS")
         
         # Start web server for health checks
         await start_web_server()
         
+        # Create the shared HTTP session on the running loop
+        get_session()
+        
         # Start Discord client
         logger.info("🔌 Connecting to Discord...")
         await discord_client.start(DISCORD_TOKEN)
         
-    except KeyboardInterrupt:
-        logger.info("🛑 Bot stopped by user")
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("🛑 Bot stopped by signal")
     except Exception as e:
         logger.error(f"❌ Fatal error: {e}")
     finally:
@@ -394,6 +707,20 @@ async def main():
             logger.info("🔌 Discord client disconnected")
         except:
             pass
+        # Stop the long-running loops first; flush_remaining picks up whatever they were holding
+        loops = [task for task in (websocket_flusher_task, vercel_flusher_task, vercel_retry_task, clock_task) if task]
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        try:
+            await asyncio.wait_for(flush_remaining(), timeout=SHUTDOWN_FLUSH_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"❌ Shutdown flush didn't finish within {SHUTDOWN_FLUSH_TIMEOUT}s - unsent messages dropped")
+        if http_session:
+            await http_session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())